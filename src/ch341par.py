@@ -1,12 +1,63 @@
 #!/usr/bin/env python
 
+import functools
+import threading
 from ctypes import *
 
+# Pin bits of the status word returned by CH341GetStatus/CH341GetInput and
+# passed to the interrupt routine, bit 7 - bit 0 are pins D7 - D0
+STATUS_ERR = 1 << 8
+STATUS_PEMP = 1 << 9
+STATUS_INT = 1 << 10
+STATUS_SLCT = 1 << 11
+STATUS_BUSY = 1 << 13
+STATUS_AUTOFD = 1 << 14
+STATUS_SLCTIN = 1 << 15
+STATUS_SDA = 1 << 23
+
+# VOID CALLBACK mPCH341_INT_ROUTINE(ULONG iStatus)
+_INT_ROUTINE = WINFUNCTYPE(None, c_ulong)
+
+# DLL functions are resolved and given their signatures once on import
+_ch341dll = windll.CH341DLL
+
+_CH341OpenDevice = _ch341dll.CH341OpenDevice
+_CH341OpenDevice.argtypes = [c_ulong]
+_CH341OpenDevice.restype = c_int
+
+_CH341CloseDevice = _ch341dll.CH341CloseDevice
+_CH341CloseDevice.argtypes = [c_ulong]
+
+_CH341GetDeviceName = _ch341dll.CH341GetDeviceName
+_CH341GetDeviceName.argtypes = [c_ulong]
+_CH341GetDeviceName.restype = c_char_p
+
+_CH341SetStream = _ch341dll.CH341SetStream
+_CH341SetStream.argtypes = [c_ulong, c_ulong]    # iIndex, iMode
+_CH341SetStream.restype = c_bool
+
+_CH341StreamSPI4 = _ch341dll.CH341StreamSPI4
+_CH341StreamSPI4.argtypes = [c_ulong, c_ulong, c_ulong, POINTER(c_ubyte)]
+_CH341StreamSPI4.restype = c_bool
+
+_CH341GetStatus = _ch341dll.CH341GetStatus
+_CH341GetStatus.argtypes = [c_ulong, POINTER(c_ulong)]    # iIndex, iStatus
+_CH341GetStatus.restype = c_bool
+
+_CH341GetInput = _ch341dll.CH341GetInput
+_CH341GetInput.argtypes = [c_ulong, POINTER(c_ulong)]    # iIndex, iStatus
+_CH341GetInput.restype = c_bool
+
+_CH341SetIntRoutine = _ch341dll.CH341SetIntRoutine
+_CH341SetIntRoutine.argtypes = [c_ulong, _INT_ROUTINE]    # iIndex, iIntRoutine
+_CH341SetIntRoutine.restype = c_bool
+
+
 class Ch341Par:
 
     def __init__(self, device_id):
         self.device_id = device_id
-        self.ch341dll = windll.CH341DLL
+        self._int_routine = None
 
     def __enter__(self):
         self.handle = self.open_device()
@@ -19,32 +70,21 @@ class Ch341Par:
             self.close_device()
 
     def open_device(self):
-        open_device = self.ch341dll.CH341OpenDevice
-        open_device.argtypes = [c_ulong]
-        open_device.restype = c_int
-        return open_device(self.device_id)
+        return _CH341OpenDevice(self.device_id)
 
     def close_device(self):
-        close_device = self.ch341dll.CH341CloseDevice
-        close_device.argtypes = [c_ulong]
-        close_device(self.device_id)
+        _CH341CloseDevice(self.device_id)
 
     def get_device_name(self):
-        get_device_name = self.ch341dll.CH341GetDeviceName
-        get_device_name.argtypes = [c_ulong]
-        get_device_name.restype = c_char_p
-        return get_device_name(self.device_id)
+        return _CH341GetDeviceName(self.device_id)
 
     def set_stream(self, i_mode):
-        set_stream = self.ch341dll.CH341SetStream
         # iMode
         # Bit 1 bit 0: I2C interface speed / SCL frequency, 00 = low speed / 20KHz, 01 = standard / 100KHz (default), 10 = fast / 400KHz, 11 = high speed / 750KHz
         # Bit 2: SPI I / O count / IO pin, 0 = single entry (D3 clock / D5 out / D7 in) (default), 1 = double entry double (D3 clock / D5 out D4 out / D7 into D6 into)
         # Bit 7: bit order in SPI byte, 0 = low first, 1 = high first
         # Other bits must be 0
-        set_stream.argtypes = [c_ulong, c_ulong]    # iIndex, iMode
-        set_stream.restype = c_bool
-        if not set_stream(self.device_id, i_mode):
+        if not _CH341SetStream(self.device_id, i_mode):
             raise Exception("Failed to set stream")
 
     def stream_spi_4(self, i_chip_select, i_length, io_buffer):
@@ -59,8 +99,50 @@ class Ch341Par:
         #                                    bit 7 is 1 parameter is valid: bit 1 bit 0 is 00/01/10 select D0 / D1 / D2 pin as low active chip select
         # 	ULONG			iLength,      // The number of bytes of data to be transferred
         # 	PVOID			ioBuffer );   // Point to a buffer, place the data to be written from DOUT, and return the data read from DIN
-        stream_spi_4 = self.ch341dll.CH341StreamSPI4
-        stream_spi_4.argtypes = [c_ulong, c_ulong, c_ulong, POINTER(c_char)]
-        stream_spi_4.restype = c_bool
-        if not stream_spi_4(self.device_id, i_chip_select, i_length, io_buffer):
+        if not _CH341StreamSPI4(self.device_id, i_chip_select, i_length, io_buffer):
             raise Exception("SPI transfer failed")
+
+    def bind_stream_spi_4(self, i_chip_select):
+        # CH341StreamSPI4 with device and chip select bound, called as f(i_length, io_buffer)
+        # Goes straight to the DLL without a Python frame, caller has to check the returned BOOL
+        return functools.partial(_CH341StreamSPI4, self.device_id, i_chip_select)
+
+    def get_status(self):
+        # Status word, see STATUS_* pin bits
+        status = c_ulong()
+        if not _CH341GetStatus(self.device_id, byref(status)):
+            raise Exception("Failed to get status")
+        return status.value
+
+    def get_input(self):
+        # Same as get_status(), but more efficient according to CH341DLL.H
+        status = c_ulong()
+        if not _CH341GetInput(self.device_id, byref(status)):
+            raise Exception("Failed to get input")
+        return status.value
+
+    def wait_interrupt(self, mask, timeout):
+        # Block until any of mask bits is set in the input status or reported by the interrupt routine
+        # Returns False if timeout (seconds) elapsed first
+        event = threading.Event()
+
+        def routine(i_status):
+            if i_status & mask:
+                event.set()
+
+        int_routine = _INT_ROUTINE(routine)
+        if not _CH341SetIntRoutine(self.device_id, int_routine):
+            raise Exception("Failed to set interrupt routine")
+        # Callback object must stay referenced until the DLL no longer calls it
+        self._int_routine = int_routine
+        try:
+            # Input is checked only after the routine is installed, so that an edge
+            # just before the wait is not missed
+            if self.get_input() & mask:
+                return True
+            return event.wait(timeout)
+        finally:
+            # NULL function pointer uninstalls the routine, None is rejected by ctypes
+            if not _CH341SetIntRoutine(self.device_id, _INT_ROUTINE()):
+                raise Exception("Failed to clear interrupt routine")
+            self._int_routine = None
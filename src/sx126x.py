@@ -4,47 +4,458 @@
 Note: public variable and function names are quoted verbatim from Sx126x datasheet.
 """
 
+import asyncio
+import functools
+import logging
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
 from ctypes import *
-from typing import Dict
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Union
 
-from ch341par import Ch341Par
+from ch341par import Ch341Par, STATUS_INT, STATUS_SLCT
 
+_log = logging.getLogger(__name__)
 
-def trace(func):
+# Fixed command frames: opcode followed by parameters or by NOPs clocking
+# out the response
+_CMD_SET_FS = b'\xC1'
+_CMD_SET_CAD = b'\xC5'
+_CMD_SET_TX_CONTINUOUS_WAVE = b'\xD1'
+_CMD_SET_TX_INFINITE_PREAMBLE = b'\xD2'
+_CMD_GET_STATS = b'\x10\x00\x00\x00\x00\x00\x00\x00'
+_CMD_GET_PACKET_TYPE = b'\x11\x00\x00'
+_CMD_GET_IRQ_STATUS = b'\x12\x00\x00\x00'
+_CMD_GET_RX_BUFFER_STATUS = b'\x13\x00\x00\x00'
+_CMD_GET_PACKET_STATUS = b'\x14\x00\x00\x00\x00'
+_CMD_GET_RSSI_INST = b'\x15\x00\x00'
+_CMD_GET_DEVICE_ERRORS = b'\x17\x00\x00\x00'
+_CMD_CLEAR_DEVICE_ERRORS = b'\x07\x00\x00'
+_CMD_RESET_STATS = b'\x00\x00\x00\x00\x00\x00\x00'
+
+# IRQ register bits, see SetDioIrqParams()
+IRQ_TX_DONE = 1 << 0
+IRQ_RX_DONE = 1 << 1
+IRQ_PREAMBLE_DETECTED = 1 << 2
+IRQ_SYNC_WORD_VALID = 1 << 3
+IRQ_HEADER_VALID = 1 << 4
+IRQ_HEADER_ERR = 1 << 5
+IRQ_CRC_ERR = 1 << 6
+IRQ_CAD_DONE = 1 << 7
+IRQ_CAD_DETECTED = 1 << 8
+IRQ_TIMEOUT = 1 << 9
+
+# OpError bits, see GetDeviceErrors()
+OP_ERR_RC64K_CALIB = 1 << 0
+OP_ERR_RC13M_CALIB = 1 << 1
+OP_ERR_PLL_CALIB = 1 << 2
+OP_ERR_ADC_CALIB = 1 << 3
+OP_ERR_IMG_CALIB = 1 << 4
+OP_ERR_XOSC_START = 1 << 5
+OP_ERR_PLL_LOCK = 1 << 6
+OP_ERR_PA_RAMP = 1 << 8
+
+# Precompiled frame packers, 24-bit fields are packed as u16 + u8 so that
+# struct rejects values out of range
+_PACK_INTO_OP_U24 = struct.Struct('>BHB').pack_into         # opcode, u24
+_PACK_INTO_OP_U24_U24 = struct.Struct('>BHBHB').pack_into   # opcode, 2 x u24
+_PACK_OP_U32 = struct.Struct('>BI').pack            # opcode, u32
+_PACK_OP_U8_U24 = struct.Struct('>BBHB').pack       # opcode, u8, u24
+_PACK_CAD_PARAMS = struct.Struct('>5BHB').pack      # opcode, 4 x u8, u24
+_PACK_MODULATION_PARAMS = struct.Struct('>9B').pack # opcode, 8 x u8
+_PACK_PACKET_PARAMS = struct.Struct('>10B').pack    # opcode, 9 x u8
+_PACK_PA_CONFIG = struct.Struct('>5B').pack         # opcode, 4 x u8
+_PACK_DIO_IRQ_PARAMS = struct.Struct('>B4H').pack   # opcode, 4 x u16
+_STRUCT_OP_U16 = struct.Struct('>BH')               # opcode, u16 or address
+_PACK_OP_U16 = _STRUCT_OP_U16.pack
+_PACK_INTO_OP_U16 = _STRUCT_OP_U16.pack_into
+
+# Precompiled response decoders, first byte is clocked out with the opcode
+_UNPACK_STATUS_U8 = struct.Struct('>xBB').unpack_from       # status, u8
+_UNPACK_STATUS_U8_U8 = struct.Struct('>xBBB').unpack_from   # status, u8, u8
+_UNPACK_STATUS_U16 = struct.Struct('>xBH').unpack_from      # status, u16
+
+# NOP bytes clocking out read data, sliced without copying
+_NOPS = memoryview(bytes(260))
+
+# SetRfFrequency() PLL step: RfFreq = Freq * 2^25 / Fxtal, with 32 MHz crystal
+_FXTAL_HZ = 32_000_000
+
+
+def _rf_freq(freq_mhz: float) -> int:
+    # Rounded to the nearest PLL step
+    return ((round(freq_mhz * 1_000_000) << 25) + _FXTAL_HZ // 2) // _FXTAL_HZ
+
+
+# RfFreq of EU868 and US915 channels, keyed by frequency in MHz
+_RF_FREQ_TABLE = {
+    freq_mhz: _rf_freq(freq_mhz) for freq_mhz in (
+        # EU868
+        867.1, 867.3, 867.5, 867.7, 867.9, 868.1, 868.3, 868.5, 868.8, 869.525,
+        # US915 uplink 125 kHz and 500 kHz channels, downlink channels
+        *(round(902.3 + 0.2 * n, 1) for n in range(64)),
+        *(round(903.0 + 1.6 * n, 1) for n in range(8)),
+        *(round(923.3 + 0.6 * n, 1) for n in range(8)),
+    )
+}
+
+
+class Status(NamedTuple):
+    status: int
+
+
+class StatusData(NamedTuple):
+    status: int
+    data: bytes
+
+
+class PacketType(NamedTuple):
+    status: int
+    packetType: int
+
+
+class IrqStatus(NamedTuple):
+    status: int
+    IrqStatus: int      # IRQ_* bits
+
+
+class RssiInst(NamedTuple):
+    status: int
+    RssiInst: int
+
+
+class RxBufferStatus(NamedTuple):
+    status: int
+    PayloadLengthRx: int
+    RxStartBufferPointer: int
+
+
+class DeviceErrors(NamedTuple):
+    status: int
+    OpError: int        # OP_ERR_* bits
+
+
+class RxPacket(NamedTuple):
+    IrqStatus: int      # IRQ_* bits
+    data: bytes
+
+
+# Status byte fields, see GetStatus(), None for unused and reserved values
+_CHIP_MODE = (None, None, 'STBY_RC', 'STBY_XOSC', 'FS', 'RX', 'TX', None)
+_CMD_STATUS = (None, None, 'DATA_AVAILABLE', 'CMD_TIMEOUT',
+               'CMD_PROCESSING_ERROR', 'CMD_EXEC_FAILURE', 'CMD_TX_DONE', None)
+
+
+def decode_status(status: int) -> tuple:
+    """
+    Decode status byte returned by the radio into (chip mode, command status)
+    names, e.g. ('STBY_RC', 'DATA_AVAILABLE').
+    """
+    return _CHIP_MODE[(status >> 4) & 7], _CMD_STATUS[(status >> 1) & 7]
+
+
+# Trace calls of public commands to the module logger at DEBUG level,
+# enabled by SX126X_TRACE=1 in the environment. Checked once when a method
+# is decorated, with tracing off decorated methods are the plain functions.
+# Logger level is usually configured only after import, so it can not be
+# used for this decision.
+_TRACE = os.getenv('SX126X_TRACE') == '1'
+
+
+def _trace(func):
+    name = func.__name__
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        print(f'? {func.__name__}')
+        _log.debug('? %s', name)
 
         original_result = func(*args, **kwargs)
 
-        print(f'! {func.__name__}: {original_result}')
+        _log.debug('! %s: %s', name, original_result)
 
         return original_result
     return wrapper
 
 
+def trace(func):
+    if not _TRACE:
+        return func
+    return _trace(func)
+
+
 class Sx126x:
 
-    def __init__(self, ch341_device_id: int, ch341_stream_mode: int, ch341_chip_select: int):
-        self.buffer = create_string_buffer(100)
+    # Fixed attribute set, no per-instance __dict__
+    __slots__ = (
+        'ch341_device_id', 'ch341_stream_mode', 'ch341_chip_select',
+        'ch341_busy_mask', 'ch341_dio1_mask',
+        '_buf', '_buf_view', '_cbuf', '_cmd2', '_cmd3',
+        '_tx_queue', '_batching', '_executor', '_device', '_spi_xfer',
+    )
+
+    def __init__(self, ch341_device_id: int, ch341_stream_mode: int, ch341_chip_select: int,
+                 ch341_dio1_mask: Optional[int], ch341_busy_mask: int = STATUS_SLCT):
+        # SPI transfer buffer shared by all commands, _cbuf is the ctypes view
+        # of the same memory passed to CH341StreamSPI4. Sized for the longest
+        # frame: a full 256 byte data buffer access plus command header.
+        self._buf = bytearray(260)
+        self._buf_view = memoryview(self._buf)
+        self._cbuf = (c_ubyte * len(self._buf)).from_buffer(self._buf)
 
         self.ch341_device_id = ch341_device_id
         self.ch341_stream_mode = ch341_stream_mode
         self.ch341_chip_select = ch341_chip_select
+        # CH341 status bits of the pins wired to radio BUSY and DIO1. The PINE64
+        # adapter wires BUSY to SLCT. DIO1 goes to ACK#, which CH341DLL.H does not
+        # map to a status bit, so it has no default, None if not wired.
+        self.ch341_busy_mask = ch341_busy_mask
+        self.ch341_dio1_mask = ch341_dio1_mask
+
+        # Reusable frames of fixed length 2 and 3 byte commands
+        self._cmd2 = bytearray(2)
+        self._cmd3 = bytearray(3)
+
+        # Commands waiting for _flush()
+        self._tx_queue = []
+        # Queue commands without response instead of sending them, see begin_batch()
+        self._batching = False
+
+        # Single worker thread for async calls, created on first use
+        self._executor = None
+
+        # Open device once and keep it open for all subsequent SPI transfers
+        self._device = Ch341Par(self.ch341_device_id).__enter__()
+        try:
+            _log.debug("CH341 device %d: %s", self.ch341_device_id, self._device.get_device_name())
+            # Set device stream mode
+            self._device.set_stream(self.ch341_stream_mode)
+            # SPI transfer of this device and chip select, see _transfer()
+            self._spi_xfer = self._device.bind_stream_spi_4(self.ch341_chip_select)
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, trace):
+        self.close()
+
+    def __del__(self):
+        # Opening the device may have failed before _device was set
+        if getattr(self, '_device', None) is not None:
+            self.close()
 
-        # Set device stream mode
-        with Ch341Par(self.ch341_device_id) as device:
-            print(device.get_device_name())
-            device.set_stream(self.ch341_stream_mode)
+    def close(self) -> None:
+        """
+        Release the CH341 device. The instance can not be used afterwards.
+        Commands still queued by an open batch are sent first.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._device is not None:
+            try:
+                if self._tx_queue:
+                    self.flush_batch()
+            finally:
+                self._device.__exit__(None, None, None)
+                self._device = None
+
+    def _send_command(self, cmd_bytes: bytes) -> memoryview:
+        # Commands queued so far have to reach the radio first
+        if self._tx_queue:
+            self._flush()
+
+        byte_count = len(cmd_bytes)
+        self._buf[:byte_count] = cmd_bytes
+        return self._send_raw(byte_count)
+
+    def _send_raw(self, byte_count: int) -> memoryview:
+        """
+        Transfer the first byte_count bytes of the SPI buffer, written there
+        by the caller, and return the response. Pending queued commands
+        have to be flushed before the buffer is filled.
+        The response is a view of the SPI buffer, valid only until the next
+        transfer. Copy anything that is kept longer.
+        """
+        self._transfer(byte_count)
+        return self._buf_view[:byte_count]
+
+    def _send_command_copy(self, cmd_bytes: bytes) -> bytes:
+        # Response copied out of the SPI buffer
+        return bytes(self._send_command(cmd_bytes))
+
+    def _send_command_noreturn(self, cmd_bytes: bytes) -> None:
+        """
+        Send command whose response is not used by the caller. The command
+        is only queued while a batch is open. The response is never copied
+        out of the SPI buffer.
+        """
+        if self._batching:
+            self._queue(cmd_bytes)
+            return
 
-    def _send_command(self, cmd_bytes: bytes) -> bytes:
-        self.buffer.value = cmd_bytes
         byte_count = len(cmd_bytes)
+        self._buf[:byte_count] = cmd_bytes
+        self._transfer(byte_count)
+
+    def _cmd1(self, opcode: int, arg: int) -> None:
+        # Command with a single one byte parameter, built in place
+        cmd_bytes = self._cmd2
+        cmd_bytes[0] = opcode
+        cmd_bytes[1] = arg
+        self._send_command_noreturn(cmd_bytes)
+
+    def _send_buf_noreturn(self, byte_count: int) -> None:
+        """
+        Same as _send_command_noreturn() for a command packed straight into
+        the SPI buffer. Commands are queued only while a batch is open, so
+        the caller can pack into the buffer without flushing first.
+        """
+        if self._batching:
+            self._queue(self._buf_view[:byte_count])
+            return
+
+        self._transfer(byte_count)
+
+    def _transfer(self, byte_count: int) -> None:
+        # Single level check, the command has to be formatted before
+        # the response overwrites it
+        debug = _log.isEnabledFor(logging.DEBUG)
+        if debug:
+            cmd_hex = self._buf_view[:byte_count].hex()
+
+        if not self._spi_xfer(byte_count, self._cbuf):
+            raise Exception("SPI transfer failed")
+        if debug:
+            _log.debug("[%d] %s > %s", byte_count, cmd_hex, self._buf_view[:byte_count].hex())
+
+    def _queue(self, cmd_bytes: bytes) -> None:
+        """
+        Queue command for sending by the next _flush() call.
+        """
+        # Copy, cmd_bytes may be one of the reused frame buffers
+        self._tx_queue.append(bytes(cmd_bytes))
 
-        with Ch341Par(self.ch341_device_id) as device:
-            device.stream_spi_4(self.ch341_chip_select, byte_count, self.buffer)
-        print("[{}] {} > {}".format(byte_count, cmd_bytes.hex(), bytes(self.buffer[:byte_count]).hex()))
+    def _flush(self) -> List[bytes]:
+        """
+        Send all queued commands back-to-back and return their responses
+        in queue order.
+        Sx126x executes a command on the rising edge of NSS, so each command
+        still needs its own chip select cycle and can not be merged into
+        a single SPI transfer with its neighbours.
+        """
+        tx_queue = self._tx_queue
+        self._tx_queue = []
+        return self.send_batch(tx_queue)
 
-        return bytes(self.buffer[:byte_count])
+    def send_batch(self, cmds: Iterable[bytes]) -> List[bytes]:
+        """
+        Send raw command frames back-to-back over the open device and return
+        their responses in order. Each frame gets its own chip select cycle.
+        Commands queued by a batch opened with begin_batch() are sent first.
+        """
+        send_command = self._send_command_copy
+        return [send_command(cmd_bytes) for cmd_bytes in cmds]
+
+    def _run_async(self, func: Callable, *args) -> 'asyncio.Future':
+        # CH341 serves one transfer at a time, so a single worker thread keeps
+        # commands in submission order while the event loop stays free
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sx126x')
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def call_async(self, command: Callable, *args) -> Any:
+        """
+        Run a command method, e.g. sx.call_async(sx.GetIrqStatus), on the
+        worker thread and await its result. Commands submitted this way
+        run in submission order. Do not call commands synchronously from
+        another thread while async calls are pending.
+        """
+        return await self._run_async(command, *args)
+
+    def begin_batch(self) -> None:
+        """
+        Start collecting commands which do not return data (Set*, Calibrate*,
+        ClearIrqStatus, ...) instead of sending each one immediately.
+        Commands returning data are still sent right away, preceded by
+        everything queued before them.
+        """
+        self._batching = True
+
+    def flush_batch(self) -> List[bytes]:
+        """
+        Stop collecting commands, send all queued commands back-to-back
+        and return their responses in order.
+        """
+        self._batching = False
+        return self._flush()
+
+    def WaitOnBusy(self, timeout: float) -> bool:
+        """
+        Wait until the radio releases the BUSY line. The pin is read directly
+        from CH341 inputs, no SPI command is issued.
+        Returns False if BUSY is still high after timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while self._device.get_input() & self.ch341_busy_mask:
+            if time.monotonic() >= deadline:
+                return False
+        return True
+
+    def WaitOnDio1(self, timeout: float) -> bool:
+        """
+        Wait until the radio raises DIO1, i.e. an IRQ mapped to DIO1 by
+        SetDioIrqParams() occurred. The pin is read from CH341 inputs instead
+        of polling GetIrqStatus(). Only INT# raises the CH341 interrupt, so
+        with DIO1 wired there the wait blocks on the interrupt, otherwise
+        the pin is polled. Returns at once if DIO1 is already high.
+        Returns False if DIO1 did not rise within timeout seconds.
+        """
+        dio1_mask = self.ch341_dio1_mask
+        if dio1_mask is None:
+            raise Exception("DIO1 pin is not configured")
+        if dio1_mask == STATUS_INT:
+            return self._device.wait_interrupt(dio1_mask, timeout)
+
+        deadline = time.monotonic() + timeout
+        while not self._device.get_input() & dio1_mask:
+            if time.monotonic() >= deadline:
+                return False
+        return True
+
+    @trace
+    def rx_drain(self) -> RxPacket:
+        """
+        Receive path in one call: GetIrqStatus(), on RxDone GetRxBufferStatus()
+        and ReadBuffer() of the received payload, then ClearIrqStatus() of
+        the IRQ flags read. The radio executes a command on NSS rising edge,
+        so the commands are sent back-to-back through the SPI buffer, each in
+        its own chip select cycle.
+        data is empty unless IRQ_RX_DONE is set. Check IRQ_CRC_ERR and
+        IRQ_HEADER_ERR before using it.
+        """
+        if self._tx_queue:
+            self._flush()
+
+        buf = self._buf
+        buf[:4] = _CMD_GET_IRQ_STATUS
+        irq_status = _UNPACK_STATUS_U16(self._send_raw(4))[1]
+        data = b''
+        if irq_status & IRQ_RX_DONE:
+            buf[:4] = _CMD_GET_RX_BUFFER_STATUS
+            _, payload_length, start_pointer = _UNPACK_STATUS_U8_U8(self._send_raw(4))
+            byte_count = 3 + payload_length
+            buf[0] = 0x1E
+            buf[1] = start_pointer
+            buf[2:byte_count] = _NOPS[:payload_length + 1]
+            data = bytes(self._send_raw(byte_count)[3:])
+        if irq_status:
+            _PACK_INTO_OP_U16(buf, 0, 0x02, irq_status)
+            self._transfer(3)
+        return RxPacket(irq_status, data)
 
     # ==== 13.1 Operational Modes Functions
 
@@ -61,7 +472,7 @@ class Sx126x:
         [1]    RFU
         [0]    0 - RTC timeout disable, 1 - wake-up on RTC timeout (RC64k)
         """
-        self._send_command(bytes([0x84, sleepConfig & 0xFF]))
+        self._cmd1(0x84, sleepConfig)
 
     @trace
     def SetStandby(self, StdbyConfig: int) -> None:
@@ -77,7 +488,8 @@ class Sx126x:
          0 STDBY_RC    Device running on RC13M, set STDBY_RC mode
          1 STDBY_XOSC  Device running on XTAL 32MHz, set STDBY_XOSC mode        
         """
-        self._send_command(bytes([0x80, StdbyConfig & 0x01]))
+        assert 0 <= StdbyConfig <= 1
+        self._cmd1(0x80, StdbyConfig & 0x01)
 
     @trace
     def SetFs(self) -> None:
@@ -90,7 +502,7 @@ class Sx126x:
         the function SetRfFrequency() which is the same used for TX or RX 
         operations.
         """
-        self._send_command(b'\xC1')
+        self._send_command_noreturn(_CMD_SET_FS)
 
     @trace
     def SetTx(self, timeout: int) -> None:
@@ -114,7 +526,8 @@ class Sx126x:
                  to STBY_RC mode on timer end-of-count or when a packet has been transmitted. 
                  The maximum timeout is then 262 s.
         """
-        self._send_command(b'\x83' + timeout.to_bytes(3, 'big'))
+        _PACK_INTO_OP_U24(self._buf, 0, 0x83, timeout >> 8, timeout & 0xFF)
+        self._send_buf_noreturn(4)
 
     @trace
     def SetRx(self, timeout: int) -> None:
@@ -145,7 +558,8 @@ class Sx126x:
                  to allow complete reception of the packet. 
                  The maximum timeout is then 262 s.
         """
-        self._send_command(b'\x82' + timeout.to_bytes(3, 'big'))
+        _PACK_INTO_OP_U24(self._buf, 0, 0x82, timeout >> 8, timeout & 0xFF)
+        self._send_buf_noreturn(4)
 
     @trace
     def StopTimerOnPreamble(self, StopOnPreambleParam: int) -> None:
@@ -163,7 +577,8 @@ class Sx126x:
         0 - disable, Timer is stopped upon Sync Word or Header detection
         1 - enable, Timer is stopped upon preamble detection
         """
-        self._send_command(bytes([0x9F, StopOnPreambleParam & 0x01]))
+        assert 0 <= StopOnPreambleParam <= 1
+        self._cmd1(0x9F, StopOnPreambleParam & 0x01)
 
     @trace
     def SetRxDutyCycle(self, rxPeriod: int, sleepPeriod: int) -> None:
@@ -190,9 +605,11 @@ class Sx126x:
         Rx Duration    = rxPeriod    * 15.625 µs
         Sleep Duration = sleepPeriod * 15.625 µs
         """
-        cmd_bytes = b'\x94' + rxPeriod.to_bytes(3, 'big')
-        cmd_bytes += sleepPeriod.to_bytes(3, 'big')
-        self._send_command(cmd_bytes)
+        _PACK_INTO_OP_U24_U24(
+            self._buf, 0, 0x94,
+            rxPeriod >> 8, rxPeriod & 0xFF, sleepPeriod >> 8, sleepPeriod & 0xFF
+        )
+        self._send_buf_noreturn(7)
 
     @trace
     def SetCAD(self) -> None:
@@ -205,7 +622,7 @@ class Sx126x:
         triggers the IRQ CADdone if it has been enabled. If a valid signal has been 
         detected it also generates the IRQ CadDetected.
         """
-        self._send_command(b'\xC5')
+        self._send_command_noreturn(_CMD_SET_CAD)
 
     @trace
     def SetTxContinuousWave(self) -> None:
@@ -214,7 +631,7 @@ class Sx126x:
         (RF tone) at selected frequency and output power. The device stays in TX 
         continuous wave until the host sends a mode configuration command.
         """
-        self._send_command(b'\xD1')
+        self._send_command_noreturn(_CMD_SET_TX_CONTINUOUS_WAVE)
 
     @trace
     def SetTxInfinitePreamble(self) -> None:
@@ -228,7 +645,7 @@ class Sx126x:
         LoRa preamble symbols and, in FSK mode, the radio is only able to generate 
         FSK preamble (0x55). 
         """
-        self._send_command(b'\xD2')
+        self._send_command_noreturn(_CMD_SET_TX_INFINITE_PREAMBLE)
 
     @trace
     def SetRegulatorMode(self, regModeParam: int) -> None:
@@ -245,7 +662,8 @@ class Sx126x:
         0 Only LDO used for all modes
         1 DC_DC+LDO used for STBY_XOSC,FS, RX and TX modes
         """
-        self._send_command(bytes([0x96, regModeParam & 0x01]))
+        assert 0 <= regModeParam <= 1
+        self._cmd1(0x96, regModeParam & 0x01)
 
     @trace
     def Calibrate(self, calibParam: int) -> None:
@@ -268,7 +686,7 @@ class Sx126x:
         [6] Image
         [7] RFU, 0 only
         """
-        self._send_command(bytes([0x89, calibParam & 0xFF]))
+        self._cmd1(0x89, calibParam)
 
     @trace
     def CalibrateImage(self, freq1: int, freq2: int) -> None:
@@ -282,7 +700,11 @@ class Sx126x:
         863 - 870    0xD7    0xDB
         902 - 928    0xE1    0xE9    (default)
         """
-        self._send_command(bytes([0x98, freq1 & 0xFF, freq2 & 0xFF]))
+        cmd_bytes = self._cmd3
+        cmd_bytes[0] = 0x98
+        cmd_bytes[1] = freq1
+        cmd_bytes[2] = freq2
+        self._send_command_noreturn(cmd_bytes)
 
     @trace
     def SetPaConfig(self, paDutyCycle: int, hpMax: int, deviceSel: int) -> None:
@@ -299,12 +721,11 @@ class Sx126x:
           the maximum supported value for the SX1262 to achieve +22 dBm output power.
         - deviceSel is used to select either the SX1261 or the SX1262.
         """
-        cmd_bytes = b'\x95'
-        cmd_bytes += paDutyCycle & 0x07
-        cmd_bytes += hpMax & 0x07
-        cmd_bytes += deviceSel & 0x01
-        cmd_bytes += b'\x01'  # paLut is always 0x01
-        self._send_command(cmd_bytes)
+        assert 0 <= paDutyCycle <= 0x07 and 0 <= hpMax <= 0x07 and 0 <= deviceSel <= 1
+        # paLut is always 0x01
+        self._send_command_noreturn(_PACK_PA_CONFIG(
+            0x95, paDutyCycle & 0x07, hpMax & 0x07, deviceSel & 0x01, 0x01
+        ))
 
     @trace
     def SetRxTxFallbackMode(self, fallbackMode: int) -> None:
@@ -320,76 +741,88 @@ class Sx126x:
         0x30  STBY_XOSC The radio goes into STDBY_XOSC mode
         0x20  STDBY+RC  The radio goes into STDBY_RC mode
         """
-        self._send_command(bytes([0x93, fallbackMode & 0xFF]))
+        self._cmd1(0x93, fallbackMode)
 
     # ==== 13.2 Registers and Buffer Access
 
     @trace
-    def WriteRegister(self, write_address: int, write_bytes: bytes) -> Dict[str, bytes]:
+    def WriteRegister(self, write_address: int, write_bytes: Union[bytes, bytearray, memoryview]) -> Status:
         """
         Allows writing a block of bytes in a data memory space starting at a specific 
         address. The address is auto incremented after each data byte so that 
         data is stored in contiguous memory locations.
         """
-        cmd_bytes = b'\x0D'
-        cmd_bytes += write_address.to_bytes(2, 'big')
-        cmd_bytes += write_bytes
-        cmd_result = self._send_command(cmd_bytes)
-        print("WriteRegister (0x{:04X}): {}".format(write_address, bytes(cmd_result[4:])))
-        return {
-            'status': cmd_result[1],
-        }
+        byte_count = 3 + len(write_bytes)
+        if byte_count > len(self._buf):
+            raise ValueError("write_bytes longer than {} bytes".format(len(self._buf) - 3))
+        if self._tx_queue:
+            self._flush()
+        # Header and data go straight into the SPI buffer
+        _PACK_INTO_OP_U16(self._buf, 0, 0x0D, write_address)
+        self._buf[3:byte_count] = write_bytes
+        cmd_result = self._send_raw(byte_count)
+        return Status(cmd_result[1])
 
     @trace
-    def ReadRegister(self, read_address: int, read_length: int) -> Dict[str, bytes]:
+    def ReadRegister(self, read_address: int, read_length: int) -> StatusData:
         """
         Allows reading a block of data starting at a given address. The address 
         is auto-incremented after each byte. Note that the host has to send 
         an NOP after sending the 2 bytes of address to start receiving data 
         bytes on the next NOP sent.
         """
-        cmd_bytes = b'\x1D'
-        cmd_bytes += read_address.to_bytes(2, 'big')
-        cmd_bytes += bytes(read_length + 1)
-        cmd_result = self._send_command(cmd_bytes)
-        print("ReadRegister (0x{:04X}): {}".format(read_address, bytes(cmd_result[4:])))
-        return {
-            'status': cmd_result[3],
-            'data': cmd_result[4:],
-        }
+        byte_count = 4 + read_length
+        if byte_count > len(self._buf):
+            raise ValueError("read_length over {} bytes".format(len(self._buf) - 4))
+        if self._tx_queue:
+            self._flush()
+        # Opcode, address and NOPs for status and data bytes go straight
+        # into the SPI buffer
+        _PACK_INTO_OP_U16(self._buf, 0, 0x1D, read_address)
+        self._buf[3:byte_count] = _NOPS[:read_length + 1]
+        cmd_result = self._send_raw(byte_count)
+        return StatusData(cmd_result[3], bytes(cmd_result[4:]))
 
     @trace
-    def WriteBuffer(self, offset: int, write_bytes: bytes) -> Dict[str, bytes]:
+    def WriteBuffer(self, offset: int, write_bytes: Union[bytes, bytearray, memoryview]) -> Status:
         """
         This function is used to store data payload to be transmitted. The address 
         is auto-incremented; when it exceeds the value of 255 it is wrapped back 
         to 0 due to the circular nature of the data buffer. The address starts 
         with an offset set as a parameter of the function. 
         """
-        cmd_bytes = b'\x0E'
-        cmd_bytes += bytes([offset & 0xFF])
-        cmd_bytes += write_bytes
-        cmd_result = self._send_command(cmd_bytes)
-        print("WriteBuffer (0x{:02X}): {}".format(offset, bytes(cmd_result[2:])))
-        return {
-            'status': cmd_result[1],
-        }
+        byte_count = 2 + len(write_bytes)
+        if byte_count > len(self._buf):
+            raise ValueError("write_bytes longer than {} bytes".format(len(self._buf) - 2))
+        if self._tx_queue:
+            self._flush()
+        # Header and payload go straight into the SPI buffer
+        buf = self._buf
+        buf[0] = 0x0E
+        buf[1] = offset
+        buf[2:byte_count] = write_bytes
+        cmd_result = self._send_raw(byte_count)
+        return Status(cmd_result[1])
 
     @trace
-    def ReadBuffer(self, offset: int, read_length: int) -> Dict[str, bytes]:
+    def ReadBuffer(self, offset: int, read_length: int) -> StatusData:
         """
         Allows reading bytes of payload received starting at offset. Note that 
         the NOP must be sent after sending the offset.
         """
-        cmd_bytes = b'\x1E'
-        cmd_bytes += bytes([offset & 0xFF])
-        cmd_bytes += bytes(read_length + 1)
-        cmd_result = self._send_command(cmd_bytes)
-        print("ReadBuffer (0x{:02X}): {}".format(offset, bytes(cmd_result[3:])))
-        return {
-            'status': cmd_result[2],
-            'data': cmd_result[3:],
-        }
+        byte_count = 3 + read_length
+        if byte_count > len(self._buf):
+            raise ValueError("read_length over {} bytes".format(len(self._buf) - 3))
+        if self._tx_queue:
+            self._flush()
+        # Opcode, offset and NOPs for status and data bytes go straight
+        # into the SPI buffer
+        buf = self._buf
+        buf[0] = 0x1E
+        buf[1] = offset
+        buf[2:byte_count] = _NOPS[:read_length + 1]
+        cmd_result = self._send_raw(byte_count)
+        return StatusData(cmd_result[2], bytes(cmd_result[3:]))
 
     # ==== 13.3 DIO and IRQ Control Functions
 
@@ -425,25 +858,18 @@ class Sx126x:
         [8] CadDetected        Channel activity detected  (LoRa only)
         [9] Timeout            Rx or Tx timeout
         """
-        cmd_bytes = b'\x08'
-        cmd_bytes += IrqMask.to_bytes(2, 'big')
-        cmd_bytes += DIO1Mask.to_bytes(2, 'big')
-        cmd_bytes += DIO2Mask.to_bytes(2, 'big')
-        cmd_bytes += DIO3Mask.to_bytes(2, 'big')
-        self._send_command(cmd_bytes)
+        self._send_command_noreturn(_PACK_DIO_IRQ_PARAMS(0x08, IrqMask, DIO1Mask, DIO2Mask, DIO3Mask))
 
     @trace
-    def GetIrqStatus(self) -> Dict[str, bytes]:
+    def GetIrqStatus(self) -> IrqStatus:
         """
         This command returns the value of the IRQ register. A dedicated 10-bit 
         register called IRQ_reg is used to log IRQ sources. Each position 
         corresponds to one IRQ source.
+        IrqStatus is returned as integer, test it with IRQ_* bit masks.
         """
-        cmd_result = self._send_command(b'\x12\x00\x00\x00')
-        return {
-            'status': cmd_result[1],
-            'IrqStatus': cmd_result[2:],
-        }
+        cmd_result = self._send_command(_CMD_GET_IRQ_STATUS)
+        return IrqStatus._make(_UNPACK_STATUS_U16(cmd_result))
 
     @trace
     def ClearIrqStatus(self, ClearIrqParam: int) -> None:
@@ -457,9 +883,7 @@ class Sx126x:
         with several IRQ sources, then the DIO remains set to one until all bits 
         mapped to the DIO in the IRQ register are cleared.
         """
-        cmd_bytes = b'\x02'
-        cmd_bytes += ClearIrqParam.to_bytes(2, 'big')
-        self._send_command(cmd_bytes)
+        self._send_command_noreturn(_PACK_OP_U16(0x02, ClearIrqParam))
 
     @trace
     def SetDIO2AsRfSwitchCtrl(self, enable :int) -> None:
@@ -476,7 +900,8 @@ class Sx126x:
             DIO2 = 0 in SLEEP, STDBY_RX, STDBY_XOSC, FS and RX modes, 
             DIO2 = 1 in TX mode
         """
-        self._send_command(bytes([0x9D, enable & 0x01]))
+        assert 0 <= enable <= 1
+        self._cmd1(0x9D, enable & 0x01)
 
     @trace
     def SetDIO3AsTCXOCtrl(self, tcxoVoltage: int, delay: int) -> None:
@@ -498,10 +923,8 @@ class Sx126x:
         simply clear this flag with the ClearDeviceErrors command.
         Delay duration = delay(23:0) * 15.625 µs
         """
-        cmd_bytes = b'\x97'
-        cmd_bytes += bytes([tcxoVoltage & 0x07])
-        cmd_bytes += delay.to_bytes(3, 'big')
-        self._send_command(cmd_bytes)
+        assert 0 <= tcxoVoltage <= 0x07
+        self._send_command_noreturn(_PACK_OP_U8_U24(0x97, tcxoVoltage & 0x07, delay >> 8, delay & 0xFF))
 
     # ==== 13.4 RF Modulation and Packet-Related Functions
 
@@ -514,9 +937,18 @@ class Sx126x:
         SetRfFrequency() defines the chip frequency in FS, TX and RX modes. 
         In RX, the required IF frequency offset is automatically configured.
         """
-        cmd_bytes = b'\x86'
-        cmd_bytes += RfFreq.to_bytes(4, 'big')
-        self._send_command(cmd_bytes)
+        self._send_command_noreturn(_PACK_OP_U32(0x86, RfFreq))
+
+    @trace
+    def SetRfFrequencyMHz(self, freq_mhz: float) -> None:
+        """
+        SetRfFrequency() taking the frequency in MHz. PLL words of EU868 and
+        US915 channel frequencies are precomputed, others are calculated.
+        """
+        RfFreq = _RF_FREQ_TABLE.get(freq_mhz)
+        if RfFreq is None:
+            RfFreq = _rf_freq(freq_mhz)
+        self._send_command_noreturn(_PACK_OP_U32(0x86, RfFreq))
 
     @trace
     def SetPacketType(self, PacketType: int) -> None:
@@ -526,18 +958,16 @@ class Sx126x:
         The switch from one frame to another must be done in STDBY_RC mode.
         PacketType: 0 - GFSK, 1 - LoRa
         """
-        self._send_command(bytes([0x8A, PacketType & 0x01]))
+        assert 0 <= PacketType <= 1
+        self._cmd1(0x8A, PacketType & 0x01)
 
     @trace
-    def GetPacketType(self) -> Dict[str, bytes]:
+    def GetPacketType(self) -> PacketType:
         """
         This command returns the current operating packet type of the radio.
         """
-        cmd_result = self._send_command(b'\x11\x00\x00')
-        return {
-            'status': cmd_result[1],
-            'packetType': cmd_result[2],
-        }
+        cmd_result = self._send_command(_CMD_GET_PACKET_TYPE)
+        return PacketType._make(_UNPACK_STATUS_U8(cmd_result))
 
     @trace
     def SetTxParams(self, power: int, RampTime: int) -> None:
@@ -555,10 +985,13 @@ class Sx126x:
           0x00 - 10, 0x01 - 20, 0x02 - 40, 0x03 - 80, 0x04 - 200, 0x05 - 800,
           0x06 - 1700, 0x07 - 3400
         """
-        cmd_bytes = b'\x8E'
-        cmd_bytes += bytes([power & 0xFF])
-        cmd_bytes += bytes([RampTime & 0x07])
-        self._send_command(cmd_bytes)
+        assert 0 <= RampTime <= 0x07
+        # Negative power is sent as two's complement byte
+        cmd_bytes = self._cmd3
+        cmd_bytes[0] = 0x8E
+        cmd_bytes[1] = power & 0xFF
+        cmd_bytes[2] = RampTime & 0x07
+        self._send_command_noreturn(cmd_bytes)
 
     @trace
     def SetModulationParams(self, ModParam1: int, ModParam2: int, ModParam3: int,
@@ -570,16 +1003,11 @@ class Sx126x:
         the parameters will be interpreted differently by the chip.
         See datasheet section 13.4.5
         """
-        cmd_bytes = b'\x8B'
-        cmd_bytes += bytes([ModParam1 & 0xFF])
-        cmd_bytes += bytes([ModParam2 & 0xFF])
-        cmd_bytes += bytes([ModParam3 & 0xFF])
-        cmd_bytes += bytes([ModParam4 & 0xFF])
-        cmd_bytes += bytes([ModParam5 & 0xFF])
-        cmd_bytes += bytes([ModParam6 & 0xFF])
-        cmd_bytes += bytes([ModParam7 & 0xFF])
-        cmd_bytes += bytes([ModParam8 & 0xFF])
-        self._send_command(cmd_bytes)
+        self._send_command_noreturn(_PACK_MODULATION_PARAMS(
+            0x8B,
+            ModParam1, ModParam2, ModParam3, ModParam4,
+            ModParam5, ModParam6, ModParam7, ModParam8,
+        ))
 
     @trace
     def SetPacketParams(self, PacketParam1: int, PacketParam2: int, PacketParam3: int,
@@ -589,17 +1017,12 @@ class Sx126x:
         This command is used to set the parameters of the packet handling block.
         See datasheet section 13.4.6
         """
-        cmd_bytes = b'\x8C'
-        cmd_bytes += bytes([PacketParam1 & 0xFF])
-        cmd_bytes += bytes([PacketParam2 & 0xFF])
-        cmd_bytes += bytes([PacketParam3 & 0xFF])
-        cmd_bytes += bytes([PacketParam4 & 0xFF])
-        cmd_bytes += bytes([PacketParam5 & 0xFF])
-        cmd_bytes += bytes([PacketParam6 & 0xFF])
-        cmd_bytes += bytes([PacketParam7 & 0xFF])
-        cmd_bytes += bytes([PacketParam8 & 0xFF])
-        cmd_bytes += bytes([PacketParam9 & 0xFF])
-        self._send_command(cmd_bytes)
+        self._send_command_noreturn(_PACK_PACKET_PARAMS(
+            0x8C,
+            PacketParam1, PacketParam2, PacketParam3,
+            PacketParam4, PacketParam5, PacketParam6,
+            PacketParam7, PacketParam8, PacketParam9,
+        ))
 
     @trace
     def SetCadParams(self, cadSymbolNum: int, cadDetPeak: int, cadDetMin: int,
@@ -608,13 +1031,10 @@ class Sx126x:
         This command defines the number of symbols on which CAD operates.
         See datasheet section 13.4.7
         """
-        cmd_bytes = b'\x88'
-        cmd_bytes += bytes([cadSymbolNum & 0xFF])
-        cmd_bytes += bytes([cadDetPeak & 0xFF])
-        cmd_bytes += bytes([cadDetMin & 0xFF])
-        cmd_bytes += bytes([cadExitMode & 0xFF])
-        cmd_bytes += cadTimeout.to_bytes(3, 'big')
-        self._send_command(cmd_bytes)
+        self._send_command_noreturn(_PACK_CAD_PARAMS(
+            0x88, cadSymbolNum, cadDetPeak, cadDetMin, cadExitMode,
+            cadTimeout >> 8, cadTimeout & 0xFF
+        ))
 
     @trace
     def SetBufferBaseAddress(self, txBaseAddress: int, rxBaseAddress: int) -> None:
@@ -624,10 +1044,11 @@ class Sx126x:
         The usage and definition of those parameters are described in 
         the different packet type sections.
         """
-        cmd_bytes = b'\x8F'
-        cmd_bytes += bytes([txBaseAddress & 0xFF])
-        cmd_bytes += bytes([rxBaseAddress & 0xFF])
-        self._send_command(cmd_bytes)
+        cmd_bytes = self._cmd3
+        cmd_bytes[0] = 0x8F
+        cmd_bytes[1] = txBaseAddress
+        cmd_bytes[2] = rxBaseAddress
+        self._send_command_noreturn(cmd_bytes)
 
     @trace
     def SetLoRaSymbNumTimeout(self, SymbNum: int) -> None:
@@ -635,14 +1056,12 @@ class Sx126x:
         This command sets the number of symbols used by the modem to validate 
         a successful reception.
         """
-        cmd_bytes = b'\xA0'
-        cmd_bytes += bytes([SymbNum & 0xFF])
-        self._send_command(cmd_bytes)
+        self._cmd1(0xA0, SymbNum)
 
     # ==== 13.5 Communication Status Information
 
     @trace
-    def GetStatus(self) -> Dict[str, bytes]:
+    def GetStatus(self) -> Status:
         """
         This command can be issued at any time and the device returns the status 
         of the device. It is not strictly necessary since device returns status 
@@ -664,74 +1083,66 @@ class Sx126x:
              5  Failure to execute command
              6  Command TX done
         [0]  Reserved
-        """
-        cmd_result = self._send_command(b'\xC0\x00')
-        return {
-            'status': cmd_result[1],
-        }
+        Use decode_status() to get the field names.
+        """
+        if self._tx_queue:
+            self._flush()
+        # Polled often, the two byte frame is written straight into
+        # the SPI buffer
+        buf = self._buf
+        buf[0] = 0xC0
+        buf[1] = 0x00
+        return Status(self._send_raw(2)[1])
 
     @trace
-    def GetRxBufferStatus(self) -> Dict[str, bytes]:
+    def GetRxBufferStatus(self) -> RxBufferStatus:
         """
         This command returns the length of the last received packet 
         (PayloadLengthRx) and the address of the first byte received
         (RxStartBufferPointer). It is applicable to all modems. The address is 
         an offset relative to the first byte of the data buffer.
         """
-        cmd_result = self._send_command(b'\x13\x00\x00\x00')
-        return {
-            'status': cmd_result[1],
-            'PayloadLengthRx': cmd_result[2],
-            'RxStartBufferPointer': cmd_result[3],
-        }
+        cmd_result = self._send_command(_CMD_GET_RX_BUFFER_STATUS)
+        return RxBufferStatus._make(_UNPACK_STATUS_U8_U8(cmd_result))
 
     @trace
-    def GetPacketStatus(self) -> Dict[str, bytes]:
+    def GetPacketStatus(self) -> StatusData:
         """
         See datasheet section 13.5.3
         """
-        cmd_result = self._send_command(b'\x13\x00\x00\x00\x00')
-        return {
-            'status': cmd_result[1],
-            'data': cmd_result[2:],
-        }
+        cmd_result = self._send_command(_CMD_GET_PACKET_STATUS)
+        return StatusData(cmd_result[1], bytes(cmd_result[2:]))
 
     @trace
-    def GetRssiInst(self) -> Dict[str, bytes]:
+    def GetRssiInst(self) -> RssiInst:
         """
         This command returns the instantaneous RSSI value during reception of 
         the packet. The command is valid for all protocols.
         Signal power in dBm = -RssiInst/2 (dBm)
         """
-        cmd_result = self._send_command(b'\x15\x00\x00')
-        return {
-            'status': cmd_result[1],
-            'RssiInst': cmd_result[2],
-        }
+        cmd_result = self._send_command(_CMD_GET_RSSI_INST)
+        return RssiInst._make(_UNPACK_STATUS_U8(cmd_result))
 
     @trace
-    def GetStats(self) -> Dict[str, bytes]:
+    def GetStats(self) -> StatusData:
         """
         This command returns the number of informations received on a few last 
         packets. The command is valid for all protocols.
         """
-        cmd_result = self._send_command(b'\x10\x00\x00\x00\x00\x00\x00\x00')
-        return {
-            'status': cmd_result[1],
-            'data': cmd_result[2:],
-        }
+        cmd_result = self._send_command(_CMD_GET_STATS)
+        return StatusData(cmd_result[1], bytes(cmd_result[2:]))
 
     @trace
     def ResetStats(self) -> None:
         """
         This command resets the value read by the command GetStats.
         """
-        self._send_command(b'\x00\x00\x00\x00\x00\x00\x00')
+        self._send_command_noreturn(_CMD_RESET_STATS)
 
     # ==== 13.6 Miscellaneous
 
     @trace
-    def GetDeviceErrors(self) -> Dict[str, bytes]:
+    def GetDeviceErrors(self) -> DeviceErrors:
         """
         This commands returns possible errors flag that could occur during 
         different chip operation.
@@ -746,20 +1157,16 @@ class Sx126x:
         [7] RFU
         [8] PA ramping failed
         [15:9] RFU
+        OpError is returned as integer, test it with OP_ERR_* bit masks.
         """
-        cmd_result = self._send_command(b'\x17\x00\x00\x00')
-        return {
-            'status': cmd_result[1],
-            'OpError': cmd_result[2:],
-        }
+        cmd_result = self._send_command(_CMD_GET_DEVICE_ERRORS)
+        return DeviceErrors._make(_UNPACK_STATUS_U16(cmd_result))
 
     @trace
-    def ClearDeviceErrors(self) -> Dict[str, bytes]:
+    def ClearDeviceErrors(self) -> Status:
         """
         This commands clears all the errors recorded in the device. The errors 
         can not be cleared independently.
         """
-        cmd_result = self._send_command(b'\x07\x00\x00')
-        return {
-            'status': cmd_result[1],
-        }
+        cmd_result = self._send_command(_CMD_CLEAR_DEVICE_ERRORS)
+        return Status(cmd_result[1])